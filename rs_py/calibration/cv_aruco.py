@@ -3,7 +3,10 @@ import cv2
 import json
 import numpy as np
 import os
+import queue
+import threading
 
+from concurrent.futures import ThreadPoolExecutor
 from typing import Tuple, Optional, Union
 
 from rs_py.wrapper.rs_wrapper import RealsenseWrapper
@@ -15,6 +18,42 @@ from rs_py.utility import str2bool
 
 THICKNESS = 2
 
+# saving of the output images is done in the background.
+SAVE_WORKERS = 2
+SAVE_QUEUE_SIZE = 4
+PNG_COMPRESSION = 1
+
+# 3d points of the cube drawn on top of the detected markers.
+CUBE_POINTS = np.float32([
+    [-.5, -.5, 0], [-.5, .5, 0],
+    [.5, .5, 0], [.5, -.5, 0],
+    [-.5, -.5, 1], [-.5, .5, 1],
+    [.5, .5, 1], [.5, -.5, 1]]) * 0.05
+
+ARUCO_DICT = {
+    "DICT_4X4_50": cv2.aruco.DICT_4X4_50,
+    "DICT_4X4_100": cv2.aruco.DICT_4X4_100,
+    "DICT_4X4_250": cv2.aruco.DICT_4X4_250,
+    "DICT_4X4_1000": cv2.aruco.DICT_4X4_1000,
+    "DICT_5X5_50": cv2.aruco.DICT_5X5_50,
+    "DICT_5X5_100": cv2.aruco.DICT_5X5_100,
+    "DICT_5X5_250": cv2.aruco.DICT_5X5_250,
+    "DICT_5X5_1000": cv2.aruco.DICT_5X5_1000,
+    "DICT_6X6_50": cv2.aruco.DICT_6X6_50,
+    "DICT_6X6_100": cv2.aruco.DICT_6X6_100,
+    "DICT_6X6_250": cv2.aruco.DICT_6X6_250,
+    "DICT_6X6_1000": cv2.aruco.DICT_6X6_1000,
+    "DICT_7X7_50": cv2.aruco.DICT_7X7_50,
+    "DICT_7X7_100": cv2.aruco.DICT_7X7_100,
+    "DICT_7X7_250": cv2.aruco.DICT_7X7_250,
+    "DICT_7X7_1000": cv2.aruco.DICT_7X7_1000,
+    "DICT_ARUCO_ORIGINAL": cv2.aruco.DICT_ARUCO_ORIGINAL,
+    "DICT_APRILTAG_16h5": cv2.aruco.DICT_APRILTAG_16h5,
+    "DICT_APRILTAG_25h9": cv2.aruco.DICT_APRILTAG_25h9,
+    "DICT_APRILTAG_36h10": cv2.aruco.DICT_APRILTAG_36h10,
+    "DICT_APRILTAG_36h11": cv2.aruco.DICT_APRILTAG_36h11
+}
+
 
 def get_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser()
@@ -72,6 +111,33 @@ def get_parser() -> argparse.ArgumentParser:
                         default=0,
                         help="if 1, include rejected points in the "
                              "detected results")
+    parser.add_argument('--ar-use-aruco3',
+                        type=str2bool,
+                        default=True,
+                        help="whether to use the aruco3 detection, which "
+                             "extracts the contours on a downscaled image")
+    parser.add_argument('--ar-min-side-length-canonical-img',
+                        type=int,
+                        default=16,
+                        help="aruco3: side length of the downscaled image "
+                             "the smallest marker is mapped to")
+    parser.add_argument('--ar-min-marker-length-ratio-original-img',
+                        type=float,
+                        default=0.02,
+                        help="aruco3: smallest marker length relative to "
+                             "the original image")
+    parser.add_argument('--ar-corner-refine-apriltag',
+                        type=str2bool,
+                        default=False,
+                        help="whether to refine the corners with the april "
+                             "tag method, needed for "
+                             "--ar-apriltag-quad-decimate")
+    parser.add_argument('--ar-apriltag-quad-decimate',
+                        type=float,
+                        default=2.0,
+                        help="decimation of the image for the quad detection "
+                             "of april tags, only used with "
+                             "--ar-corner-refine-apriltag")
     # pose
     parser.add_argument('--ar-calib-path',
                         type=str,
@@ -99,8 +165,13 @@ class ArucoWrapper:
         self.type = args.ar_type
         self.display = args.ar_display
         self.save_path = None
+        self.save_prefix = None
         self.dev_sn_list = []
         self.save_path_per_dev = {}
+        self.save_prefix_per_dev = {}
+        self.pool = None
+        self.save_pool = ThreadPoolExecutor(max_workers=SAVE_WORKERS)
+        self.save_semaphore = threading.Semaphore(SAVE_QUEUE_SIZE)
         # 2. generation
         self.id = args.ar_id
         self.size = args.ar_size
@@ -108,6 +179,27 @@ class ArucoWrapper:
         # 3. detection
         self.image_path = args.ar_image_path
         self.include_rejected = args.ar_include_rejected
+        self.aruco_dict = self.get_aruco_dict()
+        aruco_params = {}
+        if args.ar_use_aruco3:
+            # requires opencv >= 4.6
+            aruco_params['useAruco3Detection'] = True
+            aruco_params['minSideLengthCanonicalImg'] = \
+                args.ar_min_side_length_canonical_img
+            aruco_params['minMarkerLengthRatioOriginalImg'] = \
+                args.ar_min_marker_length_ratio_original_img
+        if args.ar_corner_refine_apriltag:
+            aruco_params['cornerRefinementMethod'] = \
+                cv2.aruco.CORNER_REFINE_APRILTAG
+            aruco_params['aprilTagQuadDecimate'] = \
+                args.ar_apriltag_quad_decimate
+        self.aruco_params = self.get_aruco_params(**aruco_params)
+        # opencv >= 4.7 uses a stateful detector object.
+        if hasattr(cv2.aruco, 'ArucoDetector'):
+            self.aruco_detector = cv2.aruco.ArucoDetector(self.aruco_dict,
+                                                          self.aruco_params)
+        else:
+            self.aruco_detector = None
         # 4. pose estimation
         self.calib_path = None
         self.intrinsic_mat = None
@@ -123,6 +215,7 @@ class ArucoWrapper:
                 self.save_path = None
             else:
                 os.makedirs(self.save_path, exist_ok=True)
+                self.save_prefix = self.get_save_prefix(self.save_path)
             # 5.2. calib for pose estimation
             self.calib_path = args.ar_calib_path
             if self.calib_path != '-1':
@@ -140,6 +233,8 @@ class ArucoWrapper:
                                               f'/color_{ar_args.ar_mode}')
                 os.makedirs(save_path, exist_ok=True)
                 self.save_path_per_dev[dev_sn] = save_path
+                self.save_prefix_per_dev[dev_sn] = \
+                    self.get_save_prefix(save_path)
                 # 5.2. calib for pose estimation
                 calib_path = rsw.storage_paths_per_dev[dev_sn].calib
                 calib_path = os.path.join(calib_path,
@@ -152,6 +247,9 @@ class ArucoWrapper:
                         calib_data)
                 self.intrinsic_mat_per_dev[dev_sn] = intrinsic_mat
                 self.coeffs_per_dev[dev_sn] = coeffs
+            # 5.3. the devices are processed concurrently.
+            self.pool = ThreadPoolExecutor(
+                max_workers=max(1, len(self.dev_sn_list)))
 
     def step(self,
              image: Optional[Union[np.ndarray, dict]] = None,
@@ -162,11 +260,15 @@ class ArucoWrapper:
 
         elif self.mode == 'detect':
             if len(self.dev_sn_list) > 0:
-                output = {}
-                for dev_sn in self.dev_sn_list:
-                    self.save_path = self.save_path_per_dev[dev_sn]
-                    output[dev_sn] = self.detect_markers(image[dev_sn],
-                                                         idx[dev_sn])
+                output = dict(zip(
+                    self.dev_sn_list,
+                    self.pool.map(
+                        lambda dev_sn: self.detect_markers(
+                            image[dev_sn], idx[dev_sn], dev_sn),
+                        self.dev_sn_list)
+                ))
+                if self.display == 2:
+                    self.display_per_device(output)
                 if self.display == 12:
                     images = np.hstack([i['image'] for _, i in output.items()])
                     name = f"ArUCo Tag, {self.type}, {self.id}, {self.dev_sn_list}"  # noqa
@@ -183,14 +285,15 @@ class ArucoWrapper:
 
         elif self.mode == 'estimatepose':
             if len(self.dev_sn_list) > 0:
-                output = {}
-                for dev_sn in self.dev_sn_list:
-                    self.save_path = self.save_path_per_dev[dev_sn]
-                    self.calib_path = self.calib_path_per_dev[dev_sn]
-                    self.intrinsic_mat = self.intrinsic_mat_per_dev[dev_sn]
-                    self.coeffs = self.coeffs_per_dev[dev_sn]
-                    output[dev_sn] = self.estimate_pose(image[dev_sn],
-                                                        idx[dev_sn])
+                output = dict(zip(
+                    self.dev_sn_list,
+                    self.pool.map(
+                        lambda dev_sn: self.estimate_pose(
+                            image[dev_sn], idx[dev_sn], dev_sn),
+                        self.dev_sn_list)
+                ))
+                if self.display in [3, 4]:
+                    self.display_per_device(output)
                 if self.display in [13, 14]:
                     images = np.hstack([i['image'] for _, i in output.items()])
                     name = f"ArUCo Tag, {self.type}, {self.id}, {self.dev_sn_list}"  # noqa
@@ -208,15 +311,22 @@ class ArucoWrapper:
         else:
             raise ValueError("Unknown mode...")
 
+    def display_per_device(self, output: dict) -> None:
+        for dev_sn, dev_output in output.items():
+            name = f"ArUCo Tag, {self.type}, {self.id}, {dev_sn}"
+            cv2.namedWindow(name)
+            # cv2.moveWindow(name, 0, 0)
+            cv2.imshow(name, dev_output['image'])
+            cv2.waitKey(0)
+
     # Based on :
     # https://pyimagesearch.com/2020/12/14/generating-aruco-markers-with-opencv-and-python/
     def generate_marker(self):
 
         printout(f"generating ArUCo type {self.type} with ID {self.id}", 'i')
 
-        aruco_dict = self.get_aruco_dict()
         marker = np.zeros((self.size, self.size, 1), dtype=np.uint8)
-        cv2.aruco.drawMarker(aruco_dict, self.id, self.size, marker, 1)
+        cv2.aruco.drawMarker(self.aruco_dict, self.id, self.size, marker, 1)
 
         if self.save_path is not None:
             if self.dummy == 1:
@@ -224,11 +334,11 @@ class ArucoWrapper:
                 dummy = np.ones((self.size+200, self.size+200, 1),
                                 dtype=np.uint8) * 255
                 dummy[100:-100, 100:-100, :] = marker
-                cv2.imwrite(output_file, dummy)
+                self.save_image(output_file, dummy)
             else:
                 output_file = f'aruco_{self.type}_{self.id}.png'
                 output_file = os.path.join(self.save_path, output_file)
-                cv2.imwrite(output_file, marker)
+                self.save_image(output_file, marker)
 
         if self.display == 1:
             name = "ArUCo Tag"
@@ -243,9 +353,17 @@ class ArucoWrapper:
     # https://pyimagesearch.com/2020/12/21/detecting-aruco-markers-with-opencv-and-python/
     def detect_markers(self,
                        image: Optional[np.ndarray] = None,
-                       idx: int = 0
+                       idx: int = 0,
+                       dev_sn: Optional[str] = None
                        ) -> dict:
 
+        # per device data is looked up here instead of being set on self so
+        # that multiple devices can be processed concurrently.
+        if dev_sn is None:
+            save_prefix = self.save_prefix
+        else:
+            save_prefix = self.save_prefix_per_dev[dev_sn]
+
         if image is None:
             printout(f"detecting ArUCo from image : {self.image_path}", 'i')
             image = cv2.imread(self.image_path)
@@ -254,12 +372,23 @@ class ArucoWrapper:
 
         printout(f"detecting ArUCo type {self.type} with ID {self.id}", 'i')
 
-        aruco_dict = self.get_aruco_dict()
-        aruco_params = self.get_aruco_params()
-        corners, ids, rejected = cv2.aruco.detectMarkers(
-            image, aruco_dict, parameters=aruco_params)
+        # detection runs on gray, drawing is still done on the color image.
+        if image.ndim == 3:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        else:
+            gray = image
+
+        if self.aruco_detector is not None:
+            corners, ids, rejected = self.aruco_detector.detectMarkers(gray)
+        else:
+            corners, ids, rejected = cv2.aruco.detectMarkers(
+                gray, self.aruco_dict, parameters=self.aruco_params)
+
+        if self.display in [2, 4] or save_prefix is not None:
 
-        if self.display in [2, 4] or self.save_path is not None:
+            # the image may be a view over the rs frame buffer, drawing is
+            # done on a copy.
+            image = image.copy()
 
             # Option 1 ----------
             # # Draw a square around the markers
@@ -299,20 +428,20 @@ class ArucoWrapper:
 
             if self.include_rejected == 1:
                 printout(f"rejected points : {rejected}", 'i')
-                for i in rejected:
-                    for points in i:
-                        for point in points:
-                            cv2.circle(image,
-                                       (int(point[0]), int(point[1])),
-                                       4, (255, 0, 255), -1)
-
-            if self.save_path is not None:
-                output_file = f'aruco_{self.type}_{self.id}_detected_{idx}.png'
-                output_file = os.path.join(self.save_path, output_file)
-                cv2.imwrite(output_file, image)
-
-            if self.display == 2:
-                name = f"ArUCo Tag, {self.type}, {self.id}, {self.dev_sn}"
+                if len(rejected) > 0:
+                    points = np.concatenate(
+                        [i.reshape(-1, 2) for i in rejected]
+                    ).astype(np.int32).tolist()
+                    for point in points:
+                        cv2.circle(image, tuple(point), 4, (255, 0, 255), -1)
+
+            if save_prefix is not None:
+                self.save_image(f'{save_prefix}detected_{idx}.png', image)
+
+            # with rsw, the devices run on the pool and the per device images
+            # are displayed in `step` on the calling thread.
+            if self.display == 2 and dev_sn is None:
+                name = f"ArUCo Tag, {self.type}, {self.id}, {dev_sn}"
                 cv2.namedWindow(name)
                 # cv2.moveWindow(name, 0, 0)
                 cv2.imshow(name, image)
@@ -329,9 +458,19 @@ class ArucoWrapper:
     # https://github.com/ddelago/Aruco-Marker-Calibration-and-Pose-Estimation/blob/master/pose_marker.py
     def estimate_pose(self,
                       image: Optional[np.ndarray] = None,
-                      idx: int = 0
+                      idx: int = 0,
+                      dev_sn: Optional[str] = None
                       ):
 
+        if dev_sn is None:
+            save_prefix = self.save_prefix
+            intrinsic_mat = self.intrinsic_mat
+            coeffs = self.coeffs
+        else:
+            save_prefix = self.save_prefix_per_dev[dev_sn]
+            intrinsic_mat = self.intrinsic_mat_per_dev[dev_sn]
+            coeffs = self.coeffs_per_dev[dev_sn]
+
         def _drawCube(img, corners, imgpts):
             imgpts = np.int32(imgpts).reshape(-1, 2)
             # draw ground floor in green
@@ -347,24 +486,13 @@ class ArucoWrapper:
 
         # assert hasattr(self, 'calib_data')
 
-        output_dict = self.detect_markers(image, idx)
+        output_dict = self.detect_markers(image, idx, dev_sn)
         image = output_dict['image']
         corners = output_dict['corners']
         ids = output_dict['ids']
         rejected = output_dict['rejected']
 
-        if ids is None:
-            return {
-                'image': image,
-                'corners': corners,
-                'ids': ids,
-                'rejected': rejected,
-                'rvecs': None,
-                'tvecs': None,
-                '_objPoints': None,
-            }
-
-        if len(ids) == 0:
+        if ids is None or len(ids) == 0:
             return {
                 'image': image,
                 'corners': corners,
@@ -380,41 +508,44 @@ class ArucoWrapper:
             cv2.aruco.estimatePoseSingleMarkers(
                 corners,
                 markerLength=0.02,
-                cameraMatrix=self.intrinsic_mat,
-                distCoeffs=self.coeffs
+                cameraMatrix=intrinsic_mat,
+                distCoeffs=coeffs
             )
 
-        if self.display in [3, 4] or self.save_path is not None:
-
-            for rvec, tvec in zip(rotation_vectors, translation_vectors):
-                # CUBE
-                objectPoints = np.float32([
-                    [-.5, -.5, 0], [-.5, .5, 0],
-                    [.5, .5, 0], [.5, -.5, 0],
-                    [-.5, -.5, 1], [-.5, .5, 1],
-                    [.5, .5, 1], [.5, -.5, 1]]) * 0.05
-                imgpts, jac = cv2.projectPoints(objectPoints=objectPoints,
-                                                rvec=rvec,
-                                                tvec=tvec,
-                                                cameraMatrix=self.intrinsic_mat,
-                                                distCoeffs=self.coeffs)
-                image = _drawCube(image, corners, imgpts)
+        if self.display in [3, 4] or save_prefix is not None:
+
+            # CUBE
+            # the cubes of all markers are moved to the camera frame and
+            # projected together in a single call.
+            rot_mats = rotation_vectors_to_matrices(rotation_vectors)
+            cube_points = np.matmul(rot_mats, CUBE_POINTS.T) + \
+                translation_vectors.reshape(-1, 3, 1)
+            cube_points = cube_points.transpose(0, 2, 1).reshape(-1, 3)
+            imgpts, jac = cv2.projectPoints(objectPoints=cube_points,
+                                            rvec=np.zeros(3),
+                                            tvec=np.zeros(3),
+                                            cameraMatrix=intrinsic_mat,
+                                            distCoeffs=coeffs)
+            imgpts = imgpts.reshape(-1, len(CUBE_POINTS), 2)
+
+            for rvec, tvec, marker_imgpts in zip(rotation_vectors,
+                                                 translation_vectors,
+                                                 imgpts):
+                image = _drawCube(image, corners, marker_imgpts)
                 # AXES
                 # image = cv2.drawFrameAxes(image=image,
-                #                           cameraMatrix=self.intrinsic_mat,
-                #                           distCoeffs=self.coeffs,
+                #                           cameraMatrix=intrinsic_mat,
+                #                           distCoeffs=coeffs,
                 #                           rvec=rvec,
                 #                           tvec=tvec,
                 #                           length=0.1,
                 #                           thickness=THICKNESS)
 
-            if self.save_path is not None:
-                output_file = f'aruco_{self.type}_{self.id}_pose_{idx}.png'
-                output_file = os.path.join(self.save_path, output_file)
-                cv2.imwrite(output_file, image)
+            if save_prefix is not None:
+                self.save_image(f'{save_prefix}pose_{idx}.png', image)
 
-            if self.display in [3, 4]:
-                name = f"ArUCo Tag, {self.type}, {self.id}, {self.dev_sn}"
+            if self.display in [3, 4] and dev_sn is None:
+                name = f"ArUCo Tag, {self.type}, {self.id}, {dev_sn}"
                 cv2.namedWindow(name)
                 # cv2.moveWindow(name, 0, 0)
                 cv2.imshow(name, image)
@@ -430,34 +561,40 @@ class ArucoWrapper:
             '_objPoints': obj_points,
         }
 
+    def save_image(self, filename: str, image: np.ndarray) -> None:
+        # the image is copied since it can still be drawn on after this call.
+        # blocks when too many images are pending.
+        self.save_semaphore.acquire()
+        future = self.save_pool.submit(
+            cv2.imwrite, filename, image.copy(),
+            [cv2.IMWRITE_PNG_COMPRESSION, PNG_COMPRESSION])
+
+        def _on_saved(future):
+            try:
+                if future.exception() is not None:
+                    printout(f"saving {filename} failed : "
+                             f"{future.exception()}", 'e')
+                elif not future.result():
+                    printout(f"saving {filename} failed...", 'e')
+            finally:
+                self.save_semaphore.release()
+
+        future.add_done_callback(_on_saved)
+
+    def close(self) -> None:
+        # waits for the pending images to be saved.
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+        self.save_pool.shutdown(wait=True)
+
+    def get_save_prefix(self, save_path: str) -> str:
+        return os.path.join(save_path, f'aruco_{self.type}_{self.id}_')
+
     def get_aruco_dict(self) -> cv2.aruco.Dictionary:
-        _ARUCO_DICT = {
-            "DICT_4X4_50": cv2.aruco.DICT_4X4_50,
-            "DICT_4X4_100": cv2.aruco.DICT_4X4_100,
-            "DICT_4X4_250": cv2.aruco.DICT_4X4_250,
-            "DICT_4X4_1000": cv2.aruco.DICT_4X4_1000,
-            "DICT_5X5_50": cv2.aruco.DICT_5X5_50,
-            "DICT_5X5_100": cv2.aruco.DICT_5X5_100,
-            "DICT_5X5_250": cv2.aruco.DICT_5X5_250,
-            "DICT_5X5_1000": cv2.aruco.DICT_5X5_1000,
-            "DICT_6X6_50": cv2.aruco.DICT_6X6_50,
-            "DICT_6X6_100": cv2.aruco.DICT_6X6_100,
-            "DICT_6X6_250": cv2.aruco.DICT_6X6_250,
-            "DICT_6X6_1000": cv2.aruco.DICT_6X6_1000,
-            "DICT_7X7_50": cv2.aruco.DICT_7X7_50,
-            "DICT_7X7_100": cv2.aruco.DICT_7X7_100,
-            "DICT_7X7_250": cv2.aruco.DICT_7X7_250,
-            "DICT_7X7_1000": cv2.aruco.DICT_7X7_1000,
-            "DICT_ARUCO_ORIGINAL": cv2.aruco.DICT_ARUCO_ORIGINAL,
-            "DICT_APRILTAG_16h5": cv2.aruco.DICT_APRILTAG_16h5,
-            "DICT_APRILTAG_25h9": cv2.aruco.DICT_APRILTAG_25h9,
-            "DICT_APRILTAG_36h10": cv2.aruco.DICT_APRILTAG_36h10,
-            "DICT_APRILTAG_36h11": cv2.aruco.DICT_APRILTAG_36h11
-        }
-        aruco_dict_type = _ARUCO_DICT.get(self.type, None)
+        aruco_dict_type = ARUCO_DICT.get(self.type, None)
         if aruco_dict_type is None:
             raise ValueError(f"Unknown 'aruco_type' : {self.type}")
-        aruco_dict = cv2.aruco.Dictionary_get(aruco_dict_type)
+        aruco_dict = cv2.aruco.getPredefinedDictionary(aruco_dict_type)
         return aruco_dict
 
     def get_aruco_params(self, **kwargs) -> cv2.aruco.DetectorParameters:
@@ -493,8 +630,19 @@ class ArucoWrapper:
         # perspectiveRemovePixelPerCell: 4
         # polygonalApproxAccuracyRate: 0.03
         # useAruco3Detection: False
-        params = cv2.aruco.DetectorParameters_create()
-        for k, v in kwargs:
+        if hasattr(cv2.aruco, 'DetectorParameters_create'):
+            params = cv2.aruco.DetectorParameters_create()
+        else:
+            params = cv2.aruco.DetectorParameters()
+        if 'useAruco3Detection' in kwargs and \
+                not hasattr(params, 'useAruco3Detection'):
+            printout("aruco3 detection needs opencv >= 4.6, "
+                     "using the default detection...", 'w')
+            kwargs = {k: v for k, v in kwargs.items()
+                      if k not in ['useAruco3Detection',
+                                   'minSideLengthCanonicalImg',
+                                   'minMarkerLengthRatioOriginalImg']}
+        for k, v in kwargs.items():
             assert hasattr(params, k)
             setattr(params, k, v)
         return params
@@ -503,26 +651,72 @@ class ArucoWrapper:
     def get_camera_matrix_and_distortion_coeffs(
             calib_data: dict) -> Tuple[np.ndarray, np.ndarray]:
 
-        intrinsic_mat = np.zeros((3, 3))
-        intrinsic_mat[0, 0] = calib_data['color']['intrinsic_mat'][0]
-        intrinsic_mat[0, 1] = calib_data['color']['intrinsic_mat'][1]
-        intrinsic_mat[0, 2] = calib_data['color']['intrinsic_mat'][2]
-        intrinsic_mat[1, 0] = calib_data['color']['intrinsic_mat'][3]
-        intrinsic_mat[1, 1] = calib_data['color']['intrinsic_mat'][4]
-        intrinsic_mat[1, 2] = calib_data['color']['intrinsic_mat'][5]
-        intrinsic_mat[2, 0] = calib_data['color']['intrinsic_mat'][6]
-        intrinsic_mat[2, 1] = calib_data['color']['intrinsic_mat'][7]
-        intrinsic_mat[2, 2] = calib_data['color']['intrinsic_mat'][8]
-
-        coeffs = np.zeros((4))
-        coeffs[0] = calib_data['color']['coeffs'][0]
-        coeffs[1] = calib_data['color']['coeffs'][1]
-        coeffs[2] = calib_data['color']['coeffs'][2]
-        coeffs[3] = calib_data['color']['coeffs'][3]
+        intrinsic_mat = np.asarray(calib_data['color']['intrinsic_mat'],
+                                   dtype=np.float64).reshape(3, 3)
+        coeffs = np.asarray(calib_data['color']['coeffs'][:4],
+                            dtype=np.float64)
 
         return intrinsic_mat, coeffs
 
 
+def rotation_vectors_to_matrices(rvecs: np.ndarray) -> np.ndarray:
+    # vectorized rodrigues formula, (K,1,3) or (K,3) -> (K,3,3)
+    rvecs = np.asarray(rvecs, dtype=np.float64).reshape(-1, 3)
+    theta = np.linalg.norm(rvecs, axis=1)
+    axis = rvecs / np.where(theta > 0, theta, 1.0)[:, None]
+    x, y, z = axis[:, 0], axis[:, 1], axis[:, 2]
+    zeros = np.zeros_like(x)
+    k_mats = np.stack([zeros, -z, y,
+                       z, zeros, -x,
+                       -y, x, zeros], axis=1).reshape(-1, 3, 3)
+    sin = np.sin(theta)[:, None, None]
+    cos = np.cos(theta)[:, None, None]
+    return np.eye(3) + sin * k_mats + (1 - cos) * np.matmul(k_mats, k_mats)
+
+
+def display_color_frames(images: dict, scale: int = 1) -> int:
+    # shows the same color buffers that are used for the aruco detection.
+    # must be called from the main thread, returns the pressed key.
+    if len(images) == 0:
+        return -1
+    output = np.hstack(list(images.values()))
+    output = cv2.resize(output, (output.shape[1]//scale,
+                                 output.shape[0]//scale))
+    name = "RealSense color"
+    cv2.namedWindow(name, cv2.WINDOW_AUTOSIZE)
+    cv2.imshow(name, output)
+    return cv2.waitKey(1)
+
+
+def capture_loop(rsw: RealsenseWrapper,
+                 frame_q: queue.Queue,
+                 stop_event: threading.Event,
+                 rs_args: argparse.Namespace) -> None:
+    """Retrieves the rs frames and puts them into the queue. When the queue
+    is full the oldest frames are dropped so that the consumer only sees the
+    most recent frames. The frames are displayed by the consumer, see
+    `display_color_frames`, which also sets `rsw.key` for the saving with
+    the 'c' key. No HighGUI calls are made in this thread."""
+    while not stop_event.is_set():
+        if rs_args.rs_save_with_key:
+            key, rsw.key = rsw.key, -1
+            rsw.storage_paths.save = key != -1 and key & 0xFF == ord('c')
+        rsw.step(
+            display=0,
+            display_and_save_with_key=False
+        )
+        try:
+            frame_q.put_nowait(rsw.frames)
+        except queue.Full:
+            # only this thread puts into the queue, so after evicting the
+            # oldest frames there is room for the new ones.
+            try:
+                frame_q.get_nowait()
+            except queue.Empty:
+                pass
+            frame_q.put_nowait(rsw.frames)
+
+
 if __name__ == '__main__':
 
     ar_args, remain_args = get_parser().parse_known_args()
@@ -535,6 +729,7 @@ if __name__ == '__main__':
     if ar_args.ar_only:
         ARW = ArucoWrapper(ar_args)
         ARW.step()
+        ARW.close()
         printout(f"Finished...", 'i')
         exit(1)
 
@@ -556,21 +751,40 @@ if __name__ == '__main__':
     # 2. Setting up AR
     ARW = ArucoWrapper(ar_args, rsw=RSW)
 
-    # 3. Live loop
+    # 3. Capture thread
+    frame_q = queue.Queue(maxsize=2)
+    stop_event = threading.Event()
+    capture_thread = threading.Thread(
+        target=capture_loop,
+        args=(RSW, frame_q, stop_event, rs_args),
+        daemon=True
+    )
+    capture_thread.start()
+
+    # 4. Live loop
     try:
         c = 0
         while True:
             printout(f"Step {c:8d}", 'i')
-            frames = RSW.step(
-                display=rs_args.rs_display_frame,
-                display_and_save_with_key=rs_args.rs_save_with_key
-            )
+            try:
+                frames = frame_q.get(timeout=1)
+            except queue.Empty:
+                if not capture_thread.is_alive():
+                    raise RuntimeError("Capture thread stopped...")
+                continue
             images, idxs = {}, {}
             for dev_sn, data in frames.items():
-                images[dev_sn] = data['color'].reshape(
+                # zero-copy view over the rs frame buffer.
+                images[dev_sn] = np.frombuffer(
+                    data['color_framedata'], dtype=np.uint8).reshape(
                     rs_args.rs_image_height, rs_args.rs_image_width, 3)
-                idxs[dev_sn] = int(data['timestamp_color'])
+                idxs[dev_sn] = int(data['color_timestamp'])
             ARW.step(images, idxs)
+            if rs_args.rs_display_frame > 0 or rs_args.rs_save_with_key:
+                key = display_color_frames(
+                    images, max(1, rs_args.rs_display_frame))
+                if key != -1:
+                    RSW.key = key
             if not len(frames) > 0:
                 printout(f"Empty...", 'w')
                 continue
@@ -580,10 +794,11 @@ if __name__ == '__main__':
 
     except Exception as e:
         printout(f"{e}", 'e')
-        printout(f"Stopping RealSense devices...", 'i')
-        RSW.stop()
 
     finally:
+        stop_event.set()
+        capture_thread.join()
+        ARW.close()
         printout(f"Final RealSense devices...", 'i')
         RSW.stop()
 
@@ -1,13 +1,33 @@
 import cv2
 import numpy as np
 import sys
+import time
+
+from functools import lru_cache
 
 from rs_py.utility import read_calib_file
-from rs_py.utility import read_depth_file
-from rs_py.utility import read_color_file
+from rs_py.utility import memmap_depth_file
+from rs_py.utility import memmap_color_file
+from rs_py.utility import get_depth_colormap_lut
 from rs_py.utility import iterate_over_raw_data
 
 
+# playback schedule, frame n is due at PLAYBACK_START + n/fps.
+PLAYBACK_START = None
+PLAYBACK_COUNT = 0
+
+
+# (h_c, w_c, h_d, w_d, color_format), parsed once per calib file.
+@lru_cache(maxsize=None)
+def get_calib_info(calib_file: str) -> tuple:
+    calib_data = read_calib_file(calib_file)
+    return (calib_data['color']['height'],
+            calib_data['color']['width'],
+            calib_data['depth']['height'],
+            calib_data['depth']['width'],
+            calib_data['color'].get('format', None))
+
+
 def data_process_fn(**kwargs):
 
     color_files = kwargs['color_files']
@@ -18,6 +38,19 @@ def data_process_fn(**kwargs):
     scale = kwargs['scale']
     fps = kwargs['fps']
 
+    # skip the decoding + drawing of frames when the playback is more than a
+    # frame behind the schedule.
+    global PLAYBACK_START, PLAYBACK_COUNT
+    due = None
+    if fps > 0:
+        now = time.perf_counter()
+        if PLAYBACK_START is None:
+            PLAYBACK_START = now
+        due = PLAYBACK_START + PLAYBACK_COUNT / fps
+        PLAYBACK_COUNT += 1
+        if now > due + 1 / fps:
+            return
+
     imgs = []
     num_dev = len(color_files)
     for dev_idx in range(num_dev):
@@ -26,26 +59,18 @@ def data_process_fn(**kwargs):
         color_dc = color_files[dev_idx][color_ts_idxs[dev_idx]]
         depth_dc = depth_files[dev_idx][depth_ts_idxs[dev_idx]]
 
-        calib_data = read_calib_file(color_dc.calib_file)
-
-        h_c = calib_data['color']['height']
-        w_c = calib_data['color']['width']
-        h_d = calib_data['depth']['height']
-        w_d = calib_data['depth']['width']
+        h_c, w_c, h_d, w_d, c_format = get_calib_info(color_dc.calib_file)
 
-        image = read_color_file(color_dc.file,
-                                calib_data['color'].get('format', None))
-        depth = read_depth_file(depth_dc.file)
+        image = memmap_color_file(color_dc.file, h_c, w_c, c_format)
+        depth = memmap_depth_file(depth_dc.file, h_d, w_d)
 
-        image = image.reshape(h_c, w_c, 3)
-        depth = depth[-h_d*w_d:].reshape(h_d, w_d)
+        # the memmap is read-only, putText needs a writable copy.
+        if not image.flags.writeable:
+            image = np.array(image, copy=True)
         # depth_i = depth[-(h_d//3)*(w_d//3+2):].reshape(h_d//3, w_d//3+2)
         # depth = cv2.resize(depth_i, (w_d, h_d))
 
-        depth = cv2.applyColorMap(
-            cv2.convertScaleAbs(depth, alpha=0.03),
-            cv2.COLORMAP_JET
-        )
+        depth = get_depth_colormap_lut(alpha=0.03)[depth]
 
         cv2.putText(image,
                     f"{color_dc.device_sn} - {color_dc.timestamp}",
@@ -75,9 +100,11 @@ def data_process_fn(**kwargs):
     cv2.namedWindow(name)
     cv2.moveWindow(name, 0, 0)
     cv2.imshow(name, output)
-    # cv2.waitKey(1000//fps)
     # cv2.waitKey(0)
-    cv2.waitKey(100)
+    if due is None:
+        cv2.waitKey(100)
+    else:
+        cv2.waitKey(max(1, int((due - time.perf_counter()) * 1000)))
 
 
 if __name__ == "__main__":
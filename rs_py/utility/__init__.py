@@ -2,9 +2,13 @@ from .utils import printout
 from .utils import str2bool
 
 from .data_collection import get_filepaths
+from .data_collection import get_filepaths_of_sensors
 from .data_collection import get_filepaths_with_timestamps
 from .data_collection import iterate_over_raw_data
 
 from .image_data import read_color_file
 from .image_data import read_depth_file
 from .image_data import read_calib_file
+from .image_data import memmap_color_file
+from .image_data import memmap_depth_file
+from .image_data import get_depth_colormap_lut
@@ -2,30 +2,42 @@ import csv
 import json
 import os
 
+from bisect import bisect_left
 from typing import Tuple, Optional
 from .utils import printout
 
 
-def get_filepaths(base_path: str, sensor: str) -> dict:
-    path = {}
-    for device in sorted(os.listdir(base_path)):
-        path[device] = {}
-        device_path = os.path.join(base_path, device)
-        for ts in sorted(os.listdir(device_path)):
-            path[device][ts] = []
-            sensor_path = os.path.join(base_path, device, ts, sensor)
-            filenames = sorted(os.listdir(sensor_path))
-            # filenames.reverse()
-            for filename in filenames:
-                path[device][ts].append(os.path.join(sensor_path, filename))
+def _sorted_scandir(path: str) -> list:
+    with os.scandir(path) as it:
+        return sorted(it, key=lambda entry: entry.name)
+
+
+def get_filepaths_of_sensors(base_path: str, sensors: list) -> dict:
+    # walks the dev > trial tree only once for all the sensors.
+    path = {sensor: {} for sensor in sensors}
+    for device in _sorted_scandir(base_path):
+        for sensor in sensors:
+            path[sensor][device.name] = {}
+        for ts in _sorted_scandir(device.path):
+            for sensor in sensors:
+                sensor_path = os.path.join(ts.path, sensor)
+                path[sensor][device.name][ts.name] = [
+                    entry.path for entry in _sorted_scandir(sensor_path)
+                ]
     return path
 
 
+def get_filepaths(base_path: str, sensor: str) -> dict:
+    return get_filepaths_of_sensors(base_path, [sensor])[sensor]
+
+
 def get_filepaths_with_timestamps(base_path: str) -> Tuple[dict, dict, list]:
     # dev > trial(as timestamp) > files(with timestamps in the name)
-    dev_trial_color_filepaths = get_filepaths(base_path, 'color')
-    dev_trial_depth_filepaths = get_filepaths(base_path, 'depth')
-    dev_trial_calib_filepaths = get_filepaths(base_path, 'calib')
+    sensor_filepaths = get_filepaths_of_sensors(base_path,
+                                                ['color', 'depth', 'calib'])
+    dev_trial_color_filepaths = sensor_filepaths['color']
+    dev_trial_depth_filepaths = sensor_filepaths['depth']
+    dev_trial_calib_filepaths = sensor_filepaths['calib']
 
     def _get_trial_list(dev_trial_x_filepaths: dict) -> list:
         out = []
@@ -39,9 +51,8 @@ def get_filepaths_with_timestamps(base_path: str) -> Tuple[dict, dict, list]:
                                  _get_trial_list(dev_trial_depth_filepaths))))
 
     def _ts_from_filepath(path: str) -> int:
-        ts = path.split('/')[-1]
-        ts, extension = os.path.splitext(ts)
-        return ts
+        # filename is '<timestamp>.<extension>'
+        return int(path[path.rfind('/')+1:path.rfind('.')])
 
     # trial(as timestamp) > dev > timestamps > [filepath, calib]
     color_dict = {trial: {} for trial in trial_list}
@@ -112,9 +123,9 @@ def iterate_over_raw_data(base_path: Optional[str] = None,
         if sync_ts == 0:
             ts_max = 0
         elif sync_ts == 1:
-            ts_color_max = max([i[0].timestamp for i in color_files])
-            ts_depth_max = max([i[0].timestamp for i in depth_files])
-            ts_max = max([ts_color_max, ts_depth_max])
+            # sorted timestamps per device, used for the bisect search.
+            color_ts_list = [[dc.timestamp for dc in i] for i in color_files]
+            depth_ts_list = [[dc.timestamp for dc in i] for i in depth_files]
             counter_color = [0] * len(color_files)
             counter_depth = [0] * len(depth_files)
         else:
@@ -134,27 +145,28 @@ def iterate_over_raw_data(base_path: Optional[str] = None,
                     if len(color_files) == 1:
                         continue
 
-                    _color_ts = []
-                    _depth_ts = []
+                    # sync to the latest of the next timestamps.
+                    _next_ts = [
+                        ts_list[counter]
+                        for ts_list, counter in
+                        zip(color_ts_list + depth_ts_list,
+                            counter_color + counter_depth)
+                        if counter < len(ts_list)
+                    ]
+                    ts_max = max(_next_ts) if len(_next_ts) > 0 else None
+
                     _color_ts_idxs = []
                     _depth_ts_idxs = []
-                    for idx, file in enumerate(color_files):
-                        ts_idx, ts = next(
-                            (i, dc.timestamp)
-                            for i, dc in enumerate(file[counter_color[idx]:])
-                            if dc.timestamp >= ts_max
-                        )
-                        _color_ts.append(ts)
+                    for idx, ts_list in enumerate(color_ts_list):
+                        ts_idx = len(ts_list) if ts_max is None else \
+                            bisect_left(ts_list, ts_max, counter_color[idx])
+                        counter_color[idx] = ts_idx + 1
                         _color_ts_idxs.append(ts_idx)
-                    for idx, file in enumerate(depth_files):
-                        ts_idx, ts = next(
-                            (i, dc.timestamp)
-                            for i, dc in enumerate(file[counter_depth[idx]:])
-                            if dc.timestamp >= ts_max
-                        )
-                        _depth_ts.append(ts)
+                    for idx, ts_list in enumerate(depth_ts_list):
+                        ts_idx = len(ts_list) if ts_max is None else \
+                            bisect_left(ts_list, ts_max, counter_depth[idx])
+                        counter_depth[idx] = ts_idx + 1
                         _depth_ts_idxs.append(ts_idx)
-                    ts_max = max(_color_ts + _depth_ts)
 
                 for idx, files in zip(_color_ts_idxs, color_files):
                     if idx >= len(files):
@@ -2,9 +2,13 @@ import csv
 import cv2
 import numpy as np
 import json
+import os
 
+from functools import lru_cache
 from typing import Optional
 
+MMAP_CACHE_SIZE = 16
+
 
 # https://github.com/IntelRealSense/librealsense/issues/4646
 def _get_brg_from_yuv(data_array: np.ndarray) -> np.ndarray:
@@ -51,6 +55,55 @@ def read_depth_file(filename: str) -> np.ndarray:
     return depth
 
 
+# Read-only memory maps over the raw .bin files. The pages are served by the OS
+# page cache, so no extra buffer is allocated/copied per frame. A small LRU
+# keeps the recently used maps (and their pages) alive.
+@lru_cache(maxsize=MMAP_CACHE_SIZE)
+def _memmap_color_bin_file(filename: str,
+                           height: int,
+                           width: int) -> np.ndarray:
+    return np.memmap(filename, dtype=np.uint8, mode='r',
+                     shape=(height, width, 3))
+
+
+def memmap_color_file(filename: str,
+                      height: int,
+                      width: int,
+                      fileformat: Optional[str] = None) -> np.ndarray:
+    if filename.endswith('.bin') and \
+            fileformat is not None and \
+            fileformat.lower() in ['bgr8', 'rgb8']:
+        image = _memmap_color_bin_file(filename, height, width)
+    else:
+        # other formats need decoding and are not memory mapped.
+        image = read_color_file(filename, fileformat)
+        image = image.reshape(height, width, 3)
+    return image
+
+
+@lru_cache(maxsize=MMAP_CACHE_SIZE)
+def memmap_depth_file(filename: str,
+                      height: int,
+                      width: int) -> np.ndarray:
+    # depth data is stored at the tail of the file.
+    offset = os.path.getsize(filename) - height*width*2
+    depth = np.memmap(filename, dtype=np.uint16, mode='r', offset=offset,
+                      shape=(height, width))
+    return depth
+
+
+# Maps every uint16 depth value directly to its BGR colormap value, so that
+# colorizing a depth image is a single lookup instead of
+# convertScaleAbs + applyColorMap.
+@lru_cache(maxsize=None)
+def get_depth_colormap_lut(alpha: float = 0.03,
+                           colormap: int = cv2.COLORMAP_JET) -> np.ndarray:
+    depth_range = np.arange(65536, dtype=np.uint16).reshape(-1, 1)
+    lut = cv2.applyColorMap(cv2.convertScaleAbs(depth_range, alpha=alpha),
+                            colormap)
+    return lut.reshape(65536, 3)
+
+
 def read_calib_file(calib_file: str) -> dict:
     calib_data = {}
     if calib_file.endswith('.json'):